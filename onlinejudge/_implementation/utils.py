@@ -2,6 +2,7 @@
 import datetime
 import http.client
 import http.cookiejar
+import json
 import posixpath
 import urllib.parse
 from logging import getLogger
@@ -12,10 +13,26 @@ import bs4
 from onlinejudge.type import *
 from onlinejudge.utils import *  # re-export
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 logger = getLogger(__name__)
 HTML_PARSER = 'lxml'
 
 
+def json_loads(s: Union[bytes, str]) -> Any:
+    """`json_loads()` is :py:func:`json.loads` which uses the faster `orjson` package if it is installed.
+
+    Give `resp.content` rather than `resp.text` to avoid decoding the whole response body into a `str` in advance.
+    """
+
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
 def previous_sibling_tag(tag: bs4.Tag) -> bs4.Tag:
     tag = tag.previous_sibling
     while tag and not isinstance(tag, bs4.Tag):
@@ -174,7 +191,8 @@ def request(method: str, url: str, session: requests.Session, raise_for_status:
     logger.info('network: %s: %s', method, url)
     if 'data' in kwargs:
         logger.debug('network: data: %s', repr(kwargs['data']))  # TODO: prepare a nice filter. This may contain credentials.
-    resp = session.request(method, url, headers={'User-Agent': 'Mozilla/5.0'}, **kwargs)
+    kwargs['headers'] = {'User-Agent': 'Mozilla/5.0', **(kwargs.get('headers') or {})}
+    resp = session.request(method, url, **kwargs)
     if resp.url != url:
         logger.info('network: redirected to: %s', resp.url)
     logger.info('network: %s %s', resp.status_code, http.client.responses[resp.status_code])  # e.g. "200 OK" or "503 Service Unavailable"
@@ -14,6 +14,8 @@ import onlinejudge._implementation.utils as utils
 import onlinejudge.dispatch
 import onlinejudge.type
 
+_SAMPLE_NAMES = frozenset(('Sample input', 'Sample output'))
+
 
 class AnarchyGolfService(onlinejudge.type.Service):
     def get_url(self) -> str:
@@ -25,6 +27,9 @@ class AnarchyGolfService(onlinejudge.type.Service):
     @classmethod
     def from_url(cls, url: str) -> Optional['AnarchyGolfService']:
         # example: http://golf.shinh.org/
+        # NOTE: reject URLs of other services before parsing them, since dispatch tries every service
+        if 'golf.shinh.org' not in url:
+            return None
         result = urllib.parse.urlparse(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc == 'golf.shinh.org':
@@ -36,42 +41,56 @@ class AnarchyGolfProblem(onlinejudge.type.Problem):
     def __init__(self, *, problem_id: str):
         self.problem_id = problem_id
 
-    def download_sample_cases(self, *, session: Optional[requests.Session] = None) -> List[onlinejudge.type.TestCase]:
+    _sample_cases = {}  # type: Dict[str, List[onlinejudge.type.TestCase]]
+
+    def download_sample_cases(self, *, refresh: bool = False, session: Optional[requests.Session] = None) -> List[onlinejudge.type.TestCase]:
+        """
+        :param refresh: download the sample cases again even if they are already cached in this process
+        """
+
+        if not refresh and self.problem_id in self._sample_cases:
+            return list(self._sample_cases[self.problem_id])
         session = session or utils.get_default_session()
         # get
         resp = utils.request('GET', self.get_url(), session=session)
         # parse
-        soup = bs4.BeautifulSoup(resp.text, utils.HTML_PARSER)
+        # only <h2> headings and the <pre>/<p> following them are needed, so skip building the rest of the tree
+        soup = bs4.BeautifulSoup(resp.text, utils.HTML_PARSER, parse_only=bs4.SoupStrainer(['h2', 'pre', 'p']))
         samples = onlinejudge._implementation.testcase_zipper.SampleZipper()
-        for h2 in soup.find_all('h2'):
-            it = self._parse_sample_tag(h2)
-            if it is not None:
-                s, name = it
-                samples.add(s.encode(), name)
-        return samples.get()
-
-    def _parse_sample_tag(self, tag: bs4.Tag) -> Optional[Tuple[str, str]]:
+        # NOTE: the strainer puts all the kept tags directly under the root, so a single scan of its children pairs each heading with the tag next to it
+        name = None  # type: Optional[str]
+        for tag in soup.children:
+            if tag.name == 'h2':
+                if name is not None:
+                    raise onlinejudge.type.SampleParseError(f'no <pre> or <p> found after the heading: {name}')
+                name = self._parse_sample_heading(tag)
+            elif name is not None:
+                samples.add(self._parse_sample_content(tag).encode(), name)
+                name = None
+        if name is not None:
+            raise onlinejudge.type.SampleParseError(f'no <pre> or <p> found after the heading: {name}')
+        self._sample_cases[self.problem_id] = samples.get()
+        return list(self._sample_cases[self.problem_id])
+
+    def _parse_sample_heading(self, tag: bs4.Tag) -> Optional[str]:
         assert isinstance(tag, bs4.Tag)
         assert tag.name == 'h2'
-        name = tag.contents[0]
-        if ':' in name:
-            name = name[:name.find(':')]
-        if name in ['Sample input', 'Sample output']:
-            nxt = tag.next_sibling
-            while nxt and nxt.string.strip() == '':
-                nxt = nxt.next_sibling
-
-            # This implementation is discussed in https://github.com/kmyk/online-judge-tools/pull/599
-            if nxt.name == 'pre':
-                s = utils.dos2unix(nxt.string[1:])
-            elif nxt.name == 'p':
-                s = ''  # *NOTHING* means that the empty string "" is input, not "\n".
-
-            return s, name
+        name, _, _ = str(tag.contents[0]).partition(':')
+        if name in _SAMPLE_NAMES:
+            return name
         return None
 
+    def _parse_sample_content(self, tag: bs4.Tag) -> str:
+        assert isinstance(tag, bs4.Tag)
+        assert tag.name in ('pre', 'p')
+        # This implementation is discussed in https://github.com/kmyk/online-judge-tools/pull/599
+        if tag.name == 'pre':
+            return utils.dos2unix(tag.get_text()[1:])
+        else:
+            return ''  # *NOTHING* means that the empty string "" is input, not "\n".
+
     def get_url(self) -> str:
-        return 'http://golf.shinh.org/p.rb?{}'.format(self.problem_id)
+        return f'http://golf.shinh.org/p.rb?{self.problem_id}'
 
     def get_service(self) -> AnarchyGolfService:
         return AnarchyGolfService()
@@ -79,6 +98,8 @@ class AnarchyGolfProblem(onlinejudge.type.Problem):
     @classmethod
     def from_url(cls, url: str) -> Optional['AnarchyGolfProblem']:
         # example: http://golf.shinh.org/p.rb?The+B+Programming+Language
+        if 'golf.shinh.org' not in url:
+            return None
         result = urllib.parse.urlparse(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc == 'golf.shinh.org' \
@@ -6,7 +6,9 @@ the module for Aizu Online Judge (http://judge.u-aizu.ac.jp/onlinejudge/)
 :note: There is the offcial API http://developers.u-aizu.ac.jp/index
 """
 
+import concurrent.futures
 import json
+import pathlib
 import re
 import string
 import urllib.parse
@@ -23,6 +25,81 @@ from onlinejudge.type import TestCase
 
 logger = getLogger(__name__)
 
+# NOTE: this is less than the default pool size of requests.adapters.HTTPAdapter, so the connections are reused
+_DOWNLOAD_SYSTEM_CASES_MAX_WORKERS = 8
+
+_COURSE_OR_CHALLENGE_PATH_RE = re.compile(r'^/(challenges|courses)/(sources|library/\d+|lesson/\d+)/(\w+)/(\w+)/(\w+)$')
+_PROBLEMS_PATH_RE = re.compile(r'^/problems/(\w+)$')
+_PROBLEM_ID_RE = re.compile(r'\w+')
+_SAMPLE_HEADING_RE = re.compile(r'入力例|出力例|Sample Input|Sample Output')
+
+
+def _parse_json_or_none(content: bytes) -> Any:
+    """`_parse_json_or_none()` parses a response of the API, and returns `None` instead of raising errors when the response is broken.
+
+    The body is retried after removing a BOM and replacing invalid UTF-8 sequences.
+    """
+
+    try:
+        return utils.json_loads(content)
+    except ValueError:
+        pass
+    try:
+        return json.loads(content.decode('utf-8', 'replace').lstrip('\ufeff'))
+    except ValueError:
+        logger.warning('broken JSON: %s', content[:100])
+        return None
+
+
+def _load_sample_cases_cache(path: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """`_load_sample_cases_cache()` reads a cache file written by `_save_sample_cases_cache()`, and returns `None` if the file is unreadable or broken.
+
+    The returned dict has the keys `etag`, `last_modified` and `samples`, and `samples` is a list of :py:class:`TestCase`.
+    """
+
+    try:
+        data = json.loads(path.read_text())
+        if not isinstance(data, dict) or not isinstance(data.get('samples'), list):
+            raise ValueError('unexpected format')
+        for key in ('etag', 'last_modified'):
+            if data.get(key) is not None and not isinstance(data[key], str):
+                raise ValueError('unexpected format')
+        samples = [TestCase(
+            sample['name'],
+            sample['input_name'],
+            sample['input_data'].encode(),
+            sample['output_name'],
+            sample['output_data'].encode(),
+        ) for sample in data['samples']]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning('broken cache is ignored: %s: %s', path, e)
+        return None
+    return {
+        'etag': data.get('etag'),
+        'last_modified': data.get('last_modified'),
+        'samples': samples,
+    }
+
+
+def _save_sample_cases_cache(path: pathlib.Path, *, etag: Optional[str], last_modified: Optional[str], samples: List[TestCase]) -> None:
+    # NOTE: the cache is only an optimization, so failing to write it must not make the download fail
+    logger.debug('save the cache to: %s', path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            'etag': etag,
+            'last_modified': last_modified,
+            'samples': [{
+                'name': sample.name,
+                'input_name': sample.input_name,
+                'input_data': sample.input_data.decode(),
+                'output_name': sample.output_name,
+                'output_data': sample.output_data.decode(),
+            } for sample in samples],
+        }))
+    except OSError as e:
+        logger.warning('failed to save the cache: %s: %s', path, e)
+
 
 class AOJService(onlinejudge.type.Service):
     def get_url(self) -> str:
@@ -35,6 +112,9 @@ class AOJService(onlinejudge.type.Service):
     def from_url(cls, url: str) -> Optional['AOJService']:
         # example: http://judge.u-aizu.ac.jp/onlinejudge/
         # example: https://onlinejudge.u-aizu.ac.jp/home
+        # NOTE: reject URLs of other services before parsing them, since dispatch tries every service
+        if 'u-aizu.ac.jp' not in url:
+            return None
         result = urllib.parse.urlparse(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc in ('judge.u-aizu.ac.jp', 'onlinejudge.u-aizu.ac.jp'):
@@ -51,9 +131,9 @@ class AOJService(onlinejudge.type.Service):
         resp = utils.request('GET', url, session=session, raise_for_status=False)
         if resp.status_code != 200:
             return False
-        data = json.loads(resp.content)
+        data = _parse_json_or_none(resp.content)
         logger.debug('self: %s', resp.content)
-        return 'id' in data
+        return isinstance(data, dict) and 'id' in data
 
 
 class AOJProblem(onlinejudge.type.Problem):
@@ -63,22 +143,47 @@ class AOJProblem(onlinejudge.type.Problem):
     def __init__(self, *, problem_id):
         self.problem_id = problem_id
 
-    def download_sample_cases(self, *, session: Optional[requests.Session] = None) -> List[TestCase]:
+    _sample_cases = {}  # type: Dict[str, List[TestCase]]
+
+    def download_sample_cases(self, *, refresh: bool = False, session: Optional[requests.Session] = None) -> List[TestCase]:
+        """
+        :param refresh: download the sample cases again even if they are already cached in this process or on disk
+        """
+
+        if not refresh and self.problem_id in self._sample_cases:
+            return list(self._sample_cases[self.problem_id])
         session = session or utils.get_default_session()
 
+        # load the cache saved by the previous run, to make a conditional request
+        cache_path = self._get_sample_cases_cache_path()
+        cache = None  # type: Optional[Dict[str, Any]]
+        headers = {}  # type: Dict[str, str]
+        if not refresh and cache_path is not None and cache_path.exists():
+            cache = _load_sample_cases_cache(cache_path)
+            if cache is not None:
+                if cache['etag']:
+                    headers['If-None-Match'] = cache['etag']
+                if cache['last_modified']:
+                    headers['If-Modified-Since'] = cache['last_modified']
+
         # get samples via the official API
         # reference: http://developers.u-aizu.ac.jp/api?key=judgedat%2Ftestcases%2Fsamples%2F%7BproblemId%7D_GET
-        url = 'https://judgedat.u-aizu.ac.jp/testcases/samples/{}'.format(self.problem_id)
-        resp = utils.request('GET', url, session=session)
-        samples = []  # type: List[TestCase]
-        for i, sample in enumerate(json.loads(resp.text)):
-            samples += [TestCase(
-                'sample-{}'.format(i + 1),
-                str(sample['serial']),
-                sample['in'].encode(),
-                str(sample['serial']),
-                sample['out'].encode(),
-            )]
+        url = f'https://judgedat.u-aizu.ac.jp/testcases/samples/{self.problem_id}'
+        resp = utils.request('GET', url, session=session, headers=headers)
+        if resp.status_code == 304 and cache is not None:
+            logger.info('sample cases are not modified since the previous download')
+            samples = cache['samples']
+            self._sample_cases[self.problem_id] = samples
+            return list(samples)
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        samples = [TestCase(
+            f'sample-{i + 1}',
+            str(sample['serial']),
+            sample['in'].encode(),
+            str(sample['serial']),
+            sample['out'].encode(),
+        ) for i, sample in enumerate(utils.json_loads(resp.content))]
 
         # parse HTML if no samples are registered
         # see: https://github.com/kmyk/online-judge-tools/issues/207
@@ -87,62 +192,88 @@ class AOJProblem(onlinejudge.type.Problem):
             logger.info("fallback: parsing HTML")
 
             # reference: http://developers.u-aizu.ac.jp/api?key=judgeapi%2Fresources%2Fdescriptions%2F%7Blang%7D%2F%7Bproblem_id%7D_GET
-            url = 'https://judgeapi.u-aizu.ac.jp/resources/descriptions/ja/{}'.format(self.problem_id)
+            url = f'https://judgeapi.u-aizu.ac.jp/resources/descriptions/ja/{self.problem_id}'
             resp = utils.request('GET', url, session=session)
-            html = json.loads(resp.text)['html']
+            html = utils.json_loads(resp.content)['html']
 
             # list h3+pre
             zipper = onlinejudge._implementation.testcase_zipper.SampleZipper()
-            expected_strings = ('入力例', '出力例', 'Sample Input', 'Sample Output')
-            soup = bs4.BeautifulSoup(html, utils.HTML_PARSER)
+            soup = bs4.BeautifulSoup(html, utils.HTML_PARSER, parse_only=bs4.SoupStrainer(['h3', 'pre']))
             for pre in soup.find_all('pre'):
                 tag = pre.find_previous_sibling()
-                if tag and tag.name == 'h3' and tag.string and any(s in tag.string for s in expected_strings):
+                if tag and tag.name == 'h3' and tag.string and _SAMPLE_HEADING_RE.search(tag.string):
                     s = utils.textfile(utils.parse_content(pre).lstrip())
                     zipper.add(s.encode(), tag.string)
             samples = zipper.get()
 
-        return samples
+        # save the cache only when the server gives validators, since otherwise we cannot know whether it is stale
+        if cache_path is not None and (etag or last_modified):
+            _save_sample_cases_cache(cache_path, etag=etag, last_modified=last_modified, samples=samples)
+
+        self._sample_cases[self.problem_id] = samples
+        return list(samples)
+
+    def _get_sample_cases_cache_path(self) -> Optional[pathlib.Path]:
+        # NOTE: problem_id may come from a query string, so it is not used as a filename unless it is safe
+        if not isinstance(self.problem_id, str) or not _PROBLEM_ID_RE.fullmatch(self.problem_id):
+            return None
+        return utils.user_cache_dir / 'aoj' / f'{self.problem_id}.json'
 
     def download_system_cases(self, *, session: Optional[requests.Session] = None) -> List[TestCase]:
         session = session or utils.get_default_session()
 
         # get header
         # reference: http://developers.u-aizu.ac.jp/api?key=judgedat%2Ftestcases%2F%7BproblemId%7D%2Fheader_GET
-        url = 'https://judgedat.u-aizu.ac.jp/testcases/{}/header'.format(self.problem_id)
+        base_url = f'https://judgedat.u-aizu.ac.jp/testcases/{self.problem_id}'
+        url = f'{base_url}/header'
         resp = utils.request('GET', url, session=session)
-        header = json.loads(resp.text)
+        header = utils.json_loads(resp.content)
 
         # get testcases via the official API
-        testcases = []  # type: List[TestCase]
-        for header in header['headers']:
-            # NOTE: the endpoints are not same to http://developers.u-aizu.ac.jp/api?key=judgedat%2Ftestcases%2F%7BproblemId%7D%2F%7Bserial%7D_GET since the json API often says "..... (terminated because of the limitation)"
-            # NOTE: even when using https://judgedat.u-aizu.ac.jp/testcases/PROBLEM_ID/SERIAL, there is the 1G limit (see https://twitter.com/beet_aizu/status/1194947611100188672)
-            url = 'https://judgedat.u-aizu.ac.jp/testcases/{}/{}'.format(self.problem_id, header['serial'])
-            resp_in = utils.request('GET', url + '/in', session=session)
-            resp_out = utils.request('GET', url + '/out', session=session)
-            testcases += [TestCase(
-                header['name'],
-                header['name'],
-                resp_in.content,
-                header['name'],
-                resp_out.content,
-            )]
-        return testcases
+        # NOTE: the files are downloaded concurrently because there are often many small testcases and each of them costs a round-trip
+        def download(url: str) -> bytes:
+            return utils.request('GET', url, session=session).content
+
+        futures = []  # type: List[Tuple[str, concurrent.futures.Future[bytes], concurrent.futures.Future[bytes]]]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_DOWNLOAD_SYSTEM_CASES_MAX_WORKERS) as executor:
+            for header in header['headers']:
+                # NOTE: the endpoints are not same to http://developers.u-aizu.ac.jp/api?key=judgedat%2Ftestcases%2F%7BproblemId%7D%2F%7Bserial%7D_GET since the json API often says "..... (terminated because of the limitation)"
+                # NOTE: even when using https://judgedat.u-aizu.ac.jp/testcases/PROBLEM_ID/SERIAL, there is the 1G limit (see https://twitter.com/beet_aizu/status/1194947611100188672)
+                url = f'{base_url}/{header["serial"]}'
+                futures.append((header['name'], executor.submit(download, f'{url}/in'), executor.submit(download, f'{url}/out')))
+            # NOTE: stop at the first failure, instead of waiting for all the queued downloads when exiting the executor
+            try:
+                for future in concurrent.futures.as_completed([future for _, future_in, future_out in futures for future in (future_in, future_out)]):
+                    future.result()
+            except BaseException:
+                for _, future_in, future_out in futures:
+                    future_in.cancel()
+                    future_out.cancel()
+                raise
+        return [TestCase(
+            name,
+            name,
+            future_in.result(),
+            name,
+            future_out.result(),
+        ) for name, future_in, future_out in futures]
 
     def get_url(self) -> str:
-        return 'http://judge.u-aizu.ac.jp/onlinejudge/description.jsp?id={}'.format(self.problem_id)
+        return f'http://judge.u-aizu.ac.jp/onlinejudge/description.jsp?id={self.problem_id}'
 
     @classmethod
     def from_url(cls, url: str) -> Optional['AOJProblem']:
+        if 'u-aizu.ac.jp' not in url:
+            return None
         result = urllib.parse.urlparse(url)
+        path = utils.normpath(result.path)
 
         # example: http://judge.u-aizu.ac.jp/onlinejudge/description.jsp?id=1169
         # example: http://judge.u-aizu.ac.jp/onlinejudge/description.jsp?id=DSL_1_A&lang=jp
         querystring = urllib.parse.parse_qs(result.query)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc == 'judge.u-aizu.ac.jp' \
-                and utils.normpath(result.path) == '/onlinejudge/description.jsp' \
+                and path == '/onlinejudge/description.jsp' \
                 and querystring.get('id') \
                 and len(querystring['id']) == 1:
             n, = querystring['id']
@@ -150,7 +281,7 @@ class AOJProblem(onlinejudge.type.Problem):
 
         # example: https://onlinejudge.u-aizu.ac.jp/challenges/sources/JAG/Prelim/2881
         # example: https://onlinejudge.u-aizu.ac.jp/courses/library/4/CGL/3/CGL_3_B
-        m = re.match(r'^/(challenges|courses)/(sources|library/\d+|lesson/\d+)/(\w+)/(\w+)/(\w+)$', utils.normpath(result.path))
+        m = _COURSE_OR_CHALLENGE_PATH_RE.match(path)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc == 'onlinejudge.u-aizu.ac.jp' \
                 and m:
@@ -159,7 +290,7 @@ class AOJProblem(onlinejudge.type.Problem):
 
         # example: https://onlinejudge.u-aizu.ac.jp/problems/0423
         # example: https://onlinejudge.u-aizu.ac.jp/problems/CGL_3_B
-        m = re.match(r'^/problems/(\w+)$', utils.normpath(result.path))
+        m = _PROBLEMS_PATH_RE.match(path)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc == 'onlinejudge.u-aizu.ac.jp' \
                 and m:
@@ -185,29 +316,56 @@ class AOJArenaProblem(onlinejudge.type.Problem):
         self.alphabet = alphabet
 
         self._problem_id = None  # Optional[str]
+        self._problem = None  # Optional[AOJProblem]
 
-    def get_problem_id(self, *, session: Optional[requests.Session] = None) -> str:
+    def get_problem_id(self, *, session: Optional[requests.Session] = None) -> Optional[str]:
         """
+        :return: `None` if the problem is not found or the response is broken. This is not cached, so the next call tries again.
         :note: use http://developers.u-aizu.ac.jp/api?key=judgeapi%2Farenas%2F%7BarenaId%7D%2Fproblems_GET
         """
 
         if self._problem_id is None:
             session = session or utils.get_default_session()
-            url = 'https://judgeapi.u-aizu.ac.jp/arenas/{}/problems'.format(self.arena_id)
+            url = f'https://judgeapi.u-aizu.ac.jp/arenas/{self.arena_id}/problems'
             resp = utils.request('GET', url, session=session)
-            problems = json.loads(resp.text)
+            problems = _parse_json_or_none(resp.content)
+            # NOTE: an unexpected response is treated the same as the problem not being found
+            if not isinstance(problems, list):
+                logger.error('failed to get the list of problems: %s', url)
+                problems = []
             for problem in problems:
-                if problem['id'] == self.alphabet:
-                    self._problem_id = problem['problemId']
+                if isinstance(problem, dict) and problem.get('id') == self.alphabet:
+                    self._problem_id = problem.get('problemId')
                     logger.debug('problem: %s', problem)
                     break
         return self._problem_id
 
-    def download_sample_cases(self, *, session: Optional[requests.Session] = None) -> List[TestCase]:
-        return AOJProblem(problem_id=self.get_problem_id()).download_sample_cases(session=session)
+    def _get_problem(self, *, session: Optional[requests.Session] = None) -> AOJProblem:
+        """
+        :raises RuntimeError: if the problem is not found
+        """
+
+        if self._problem is None:
+            problem_id = self.get_problem_id(session=session)
+            if not isinstance(problem_id, str):
+                raise RuntimeError(f'failed to get the problem of the arena: {self.get_url()}')
+            self._problem = AOJProblem(problem_id=problem_id)
+        return self._problem
+
+    def download_sample_cases(self, *, refresh: bool = False, session: Optional[requests.Session] = None) -> List[TestCase]:
+        """
+        :param refresh: download the sample cases again even if they are already cached in this process or on disk
+        :raises RuntimeError: if the problem is not found
+        """
+
+        return self._get_problem(session=session).download_sample_cases(refresh=refresh, session=session)
 
     def download_system_cases(self, *, session: Optional[requests.Session] = None) -> List[TestCase]:
-        return AOJProblem(problem_id=self.get_problem_id()).download_system_cases(session=session)
+        """
+        :raises RuntimeError: if the problem is not found
+        """
+
+        return self._get_problem(session=session).download_system_cases(session=session)
 
     def download_content(self, *, session: Optional[requests.Session] = None):
         """
@@ -216,11 +374,13 @@ class AOJArenaProblem(onlinejudge.type.Problem):
         raise NotImplementedError
 
     def get_url(self) -> str:
-        return 'https://onlinejudge.u-aizu.ac.jp/services/room.html#{}/problems/{}'.format(self.arena_id, self.alphabet)
+        return f'https://onlinejudge.u-aizu.ac.jp/services/room.html#{self.arena_id}/problems/{self.alphabet}'
 
     @classmethod
     def from_url(cls, url: str) -> Optional['AOJArenaProblem']:
         # example: https://onlinejudge.u-aizu.ac.jp/services/room.html#RitsCamp19Day2/problems/A
+        if 'u-aizu.ac.jp' not in url:
+            return None
         result = urllib.parse.urlparse(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc == 'onlinejudge.u-aizu.ac.jp' \
@@ -6,7 +6,6 @@ the module for Codeforces (https://codeforces.com/)
 """
 
 import datetime
-import json
 import re
 import string
 import urllib.parse
@@ -23,8 +22,34 @@ from onlinejudge.type import *
 
 logger = getLogger(__name__)
 
+_GYM_CONTEST_ID_THRESHOLD = 100000  # contests whose IDs are greater than or equal to this are gyms
 _CODEFORCES_DOMAINS = ('codeforces.com', 'm1.codeforces.com', 'm2.codeforces.com', 'm3.codeforces.com')
 
+_SAMPLE_CLASS_RE = re.compile(r'^(in|out)put$')
+
+_CONTEST_PATH_PATTERNS = (
+    ('contest', re.compile(r'/contest/([0-9]+).*')),  # example: https://codeforces.com/contest/538
+    ('gym', re.compile(r'/gym/([0-9]+).*')),  # example: https://codeforces.com/gym/101021
+)
+
+_PROBLEM_URL_TEMPLATES = {
+    'contest': 'https://codeforces.com/contest/{}/problem/{}',
+    'problemset': 'https://codeforces.com/problemset/problem/{}/{}',
+    'gym': 'https://codeforces.com/gym/{}/problem/{}',
+    'edu': 'https://codeforces.com/edu/course/{2}/lesson/{3}/{4}/practice/contest/{0}/problem/{1}',
+}
+
+# "0" is needed. example: https://codeforces.com/contest/1000/problem/0
+# "[1-9]?" is sometime used. example: https://codeforces.com/contest/1133/problem/F2
+# NOTE: all kinds of problem URLs are matched with one alternation, and the kind is told by which group of the branch is set
+_PROBLEM_PATH_RE = re.compile(r'''^(?:
+    /contest/(?P<c_cid>[0-9]+)/problem/(?P<c_idx>0|[A-Za-z][1-9]?)  # example: https://codeforces.com/contest/538/problem/H
+    | /problemset/problem/(?P<p_cid>[0-9]+)/(?P<p_idx>0|[A-Za-z][1-9]?)  # example: https://codeforces.com/problemset/problem/700/B
+    | /gym/(?P<g_cid>[0-9]+)/problem/(?P<g_idx>0|[A-Za-z][1-9]?)  # example: https://codeforces.com/gym/101021/problem/A
+    | /edu/course/(?P<e_course>[0-9]*)/lesson/(?P<e_lesson>[0-9]*)/(?P<e_step>[0-9]*)/practice/contest/(?P<e_cid>[0-9]*)/problem/(?P<e_idx>0|[A-Za-z][1-9]?)  # example https://codeforces.com/edu/course/2/lesson/2/1/practice/contest/269100/problem/A
+)$''', re.VERBOSE)
+_PROBLEM_PATH_KINDS = (('contest', 'c'), ('problemset', 'p'), ('gym', 'g'), ('edu', 'e'))
+
 
 class CodeforcesService(onlinejudge.type.Service):
     def login(self, *, get_credentials: onlinejudge.type.CredentialsProvider, session: Optional[requests.Session] = None) -> None:
@@ -39,7 +64,7 @@ class CodeforcesService(onlinejudge.type.Service):
             logger.info('You have already signed in.')
             return
         # parse
-        soup = bs4.BeautifulSoup(resp.text, utils.HTML_PARSER)
+        soup = bs4.BeautifulSoup(resp.content, utils.HTML_PARSER)
         form = soup.find('form', id='enterForm')
         logger.debug('form: %s', str(form))
         username, password = get_credentials()
@@ -75,7 +100,10 @@ class CodeforcesService(onlinejudge.type.Service):
     def from_url(cls, url: str) -> Optional['CodeforcesService']:
         # example: https://codeforces.com/
         # example: http://codeforces.com/
-        result = urllib.parse.urlparse(url)
+        # NOTE: reject URLs of other services before parsing them, since dispatch tries every service
+        if 'codeforces.com' not in url:
+            return None
+        result = urllib.parse.urlsplit(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc in _CODEFORCES_DOMAINS:
             return cls()
@@ -83,10 +111,10 @@ class CodeforcesService(onlinejudge.type.Service):
 
     def iterate_contest_data(self, *, is_gym: bool = False, session: Optional[requests.Session] = None) -> Iterator['CodeforcesContestData']:
         session = session or utils.get_default_session()
-        url = 'https://codeforces.com/api/contest.list?gym={}'.format('true' if is_gym else 'false')
+        url = f'https://codeforces.com/api/contest.list?gym={"true" if is_gym else "false"}'
         resp = utils.request('GET', url, session=session)
         timestamp = datetime.datetime.now(datetime.timezone.utc).astimezone()
-        data = json.loads(resp.text)
+        data = utils.json_loads(resp.content)
         assert data['status'] == 'OK'
         for row in data['result']:
             yield CodeforcesContestData._from_json(row, response=resp, session=session, timestamp=timestamp)
@@ -97,6 +125,8 @@ class CodeforcesService(onlinejudge.type.Service):
 
 
 class CodeforcesContestData(ContestData):
+    __slots__ = ('_contest', 'duration_seconds', 'frozen', '_name', 'phase', 'relative_time_seconds', '_response', '_session', 'start_time_seconds', '_timestamp', 'type')
+
     # yapf: disable
     def __init__(
             self,
@@ -172,29 +202,26 @@ class CodeforcesContest(onlinejudge.type.Contest):
     :ivar contest_id: :py:class:`int`
     :ivar kind: :py:class:`str` must be `contest` or `gym`
     """
+    __slots__ = ('contest_id', 'kind')
+
     def __init__(self, *, contest_id: int, kind: Optional[str] = None):
         assert kind in (None, 'contest', 'gym')
         self.contest_id = contest_id
-        if kind is None:
-            if self.contest_id < 100000:
-                kind = 'contest'
-            else:
-                kind = 'gym'
-        self.kind = kind
+        self.kind = kind if kind is not None else ('contest' if contest_id < _GYM_CONTEST_ID_THRESHOLD else 'gym')
 
     def get_url(self) -> str:
-        return 'https://codeforces.com/{}/{}'.format(self.kind, self.contest_id)
+        return f'https://codeforces.com/{self.kind}/{self.contest_id}'
 
     @classmethod
     def from_url(cls, url: str) -> Optional['CodeforcesContest']:
-        result = urllib.parse.urlparse(url)
+        if 'codeforces.com' not in url:
+            return None
+        result = urllib.parse.urlsplit(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc in _CODEFORCES_DOMAINS:
-            table = {}
-            table['contest'] = r'/contest/([0-9]+).*'.format()  # example: https://codeforces.com/contest/538
-            table['gym'] = r'/gym/([0-9]+).*'.format()  # example: https://codeforces.com/gym/101021
-            for kind, expr in table.items():
-                m = re.match(expr, utils.normpath(result.path))
+            path = utils.normpath(result.path)
+            for kind, pattern in _CONTEST_PATH_PATTERNS:
+                m = pattern.match(path)
                 if m:
                     return cls(contest_id=int(m.group(1)), kind=kind)
         return None
@@ -202,29 +229,36 @@ class CodeforcesContest(onlinejudge.type.Contest):
     def get_service(self) -> CodeforcesService:
         return CodeforcesService()
 
-    def list_problem_data(self, *, session: Optional[requests.Session] = None) -> List['CodeforcesProblemData']:
-        session = session or utils.get_default_session()
-        url = 'https://codeforces.com/api/contest.standings?contestId={}&from=1&count=1'.format(self.contest_id)
+    def _download_standings(self, *, session: requests.Session) -> Tuple[Dict[str, Any], requests.Response, datetime.datetime]:
+        """`_download_standings` wraps the official API, which returns both the contest and its problems.
+
+        :note: the result is not cached, because the contest (e.g. its phase) changes over time.
+        """
+
+        url = f'https://codeforces.com/api/contest.standings?contestId={self.contest_id}&from=1&count=1'
         resp = utils.request('GET', url, session=session)
         timestamp = datetime.datetime.now(datetime.timezone.utc).astimezone()
-        data = json.loads(resp.text)
+        data = utils.json_loads(resp.content)
         assert data['status'] == 'OK'
-        return [CodeforcesProblemData._from_json(row, response=resp, session=session, timestamp=timestamp) for row in data['result']['problems']]
+        return data['result'], resp, timestamp
+
+    def list_problem_data(self, *, session: Optional[requests.Session] = None) -> List['CodeforcesProblemData']:
+        session = session or utils.get_default_session()
+        result, resp, timestamp = self._download_standings(session=session)
+        return [CodeforcesProblemData._from_json(row, response=resp, session=session, timestamp=timestamp) for row in result['problems']]
 
     def list_problems(self, *, session: Optional[requests.Session] = None) -> Sequence['CodeforcesProblem']:
         return tuple(data.problem for data in self.list_problem_data(session=session))
 
     def download_data(self, *, session: Optional[requests.Session] = None) -> CodeforcesContestData:
         session = session or utils.get_default_session()
-        url = 'https://codeforces.com/api/contest.standings?contestId={}&from=1&count=1'.format(self.contest_id)
-        resp = utils.request('GET', url, session=session)
-        timestamp = datetime.datetime.now(datetime.timezone.utc).astimezone()
-        data = json.loads(resp.text)
-        assert data['status'] == 'OK'
-        return CodeforcesContestData._from_json(data['result']['contest'], response=resp, session=session, timestamp=timestamp)
+        result, resp, timestamp = self._download_standings(session=session)
+        return CodeforcesContestData._from_json(result['contest'], response=resp, session=session, timestamp=timestamp)
 
 
 class CodeforcesProblemData(ProblemData):
+    __slots__ = ('_name', 'points', '_problem', 'rating', '_response', '_session', 'tags', '_timestamp', 'type')
+
     # yapf: disable
     def __init__(
             self,
@@ -276,11 +310,13 @@ class CodeforcesProblemData(ProblemData):
 
     @classmethod
     def _from_json(cls, row: Dict[str, Any], response: requests.Response, session: requests.Session, timestamp: datetime.datetime) -> 'CodeforcesProblemData':
+        points = row.get('points')
+        rating = row.get('rating')
         return CodeforcesProblemData(
             name=row['name'],
-            points=(int(row['points']) if 'points' in row else None),
+            points=(int(points) if points is not None else None),
             problem=CodeforcesProblem(contest_id=row['contestId'], index=row['index']),
-            rating=(int(row['rating']) if 'rating' in row else None),
+            rating=(int(rating) if rating is not None else None),
             response=response,
             session=session,
             tags=row['tags'],
@@ -299,6 +335,8 @@ class CodeforcesProblem(onlinejudge.type.Problem):
     :ivar lesson: py:class:'int' only used for edu but needed to reconstruct URL
     :ivar step: py:class:'int' only used for edu but needed to reconstruct URL
     """
+    __slots__ = ('contest_id', 'index', 'kind', 'course', 'lesson', 'step')
+
     def __init__(self, *, contest_id: int, index: str, kind: Optional[str] = None, course: Optional[int] = None, lesson: Optional[int] = None, step: Optional[int] = None):
         assert isinstance(contest_id, int)
         assert 1 <= len(index) <= 2
@@ -308,12 +346,7 @@ class CodeforcesProblem(onlinejudge.type.Problem):
         assert kind in (None, 'contest', 'gym', 'problemset', 'edu')
         self.contest_id = contest_id
         self.index = index
-        if kind is None:
-            if self.contest_id < 100000:
-                kind = 'contest'
-            else:
-                kind = 'gym'
-        self.kind = kind  # It seems 'gym' is specialized, 'contest' and 'problemset' are the same thing
+        self.kind = kind if kind is not None else ('contest' if contest_id < _GYM_CONTEST_ID_THRESHOLD else 'gym')  # It seems 'gym' is specialized, 'contest' and 'problemset' are the same thing
         self.course = course
         self.lesson = lesson
         self.step = step
@@ -323,16 +356,14 @@ class CodeforcesProblem(onlinejudge.type.Problem):
         # get
         resp = utils.request('GET', self.get_url(), session=session)
         # parse
-        soup = bs4.BeautifulSoup(resp.text, utils.HTML_PARSER)
+        soup = bs4.BeautifulSoup(resp.content, utils.HTML_PARSER, parse_only=bs4.SoupStrainer('div', class_=_SAMPLE_CLASS_RE))
         samples = onlinejudge._implementation.testcase_zipper.SampleZipper()
-        for tag in soup.find_all('div', class_=re.compile('^(in|out)put$')):  # Codeforces writes very nice HTML :)
+        for tag in soup.select('div.input, div.output'):  # Codeforces writes very nice HTML :)
             logger.debug('tag: %s', str(tag))
-            non_empty_children = [child for child in tag.children if child.name or child.strip()]
-            logger.debug("tags after removing empty strings: %s", non_empty_children)
-            assert len(non_empty_children) == 2  # if not 2, next line throws ValueError.
-            title, pre = list(non_empty_children)
-            assert 'title' in title.attrs['class']
-            assert pre.name == 'pre'
+            title = tag.select_one(':scope > .title')
+            pre = tag.select_one(':scope > pre')
+            assert title is not None
+            assert pre is not None
             data = utils.format_sample_case(str(utils.parse_content(pre)))
             samples.add(data.encode(), title.string)
         return samples.get()
@@ -346,7 +377,7 @@ class CodeforcesProblem(onlinejudge.type.Problem):
         # get
         resp = utils.request('GET', self.get_url(), session=session)
         # parse
-        soup = bs4.BeautifulSoup(resp.text, utils.HTML_PARSER)
+        soup = bs4.BeautifulSoup(resp.content, utils.HTML_PARSER, parse_only=bs4.SoupStrainer('select', attrs={'name': 'programTypeId'}))
         select = soup.find('select', attrs={'name': 'programTypeId'})
         if select is None:
             raise NotLoggedInError
@@ -365,12 +396,7 @@ class CodeforcesProblem(onlinejudge.type.Problem):
         raise SubmissionError(msg)
 
     def get_url(self) -> str:
-        table = {}
-        table['contest'] = 'https://codeforces.com/contest/{}/problem/{}'
-        table['problemset'] = 'https://codeforces.com/problemset/problem/{}/{}'
-        table['gym'] = 'https://codeforces.com/gym/{}/problem/{}'
-        table['edu'] = 'https://codeforces.com/edu/course/{2}/lesson/{3}/{4}/practice/contest/{0}/problem/{1}'
-        return table[self.kind].format(self.contest_id, self.index, self.course, self.lesson, self.step)
+        return _PROBLEM_URL_TEMPLATES[self.kind].format(self.contest_id, self.index, self.course, self.lesson, self.step)
 
     def get_service(self) -> CodeforcesService:
         return CodeforcesService()
@@ -381,33 +407,28 @@ class CodeforcesProblem(onlinejudge.type.Problem):
 
     @classmethod
     def from_url(cls, url: str) -> Optional['CodeforcesProblem']:
-        result = urllib.parse.urlparse(url)
+        if 'codeforces.com' not in url:
+            return None
+        result = urllib.parse.urlsplit(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc in _CODEFORCES_DOMAINS:
-            # "0" is needed. example: https://codeforces.com/contest/1000/problem/0
-            # "[1-9]?" is sometime used. example: https://codeforces.com/contest/1133/problem/F2
-            re_for_index = r'(?P<index>0|[A-Za-z][1-9]?)'
-            table = {}
-            table['contest'] = r'^/contest/(?P<contest>[0-9]+)/problem/{}$'.format(re_for_index)  # example: https://codeforces.com/contest/538/problem/H
-            table['problemset'] = r'^/problemset/problem/(?P<contest>[0-9]+)/{}$'.format(re_for_index)  # example: https://codeforces.com/problemset/problem/700/B
-            table['gym'] = r'^/gym/(?P<contest>[0-9]+)/problem/{}$'.format(re_for_index)  # example: https://codeforces.com/gym/101021/problem/A
-            table['edu'] = r'^/edu/course/(?P<course>[0-9]*)/lesson/(?P<lesson>[0-9]*)/(?P<step>[0-9]*)/practice/contest/(?P<contest>[0-9]*)/problem/{}$'.format(re_for_index)  # example https://codeforces.com/edu/course/2/lesson/2/1/practice/contest/269100/problem/A
-            for kind, expr in table.items():
-                m = re.match(expr, utils.normpath(result.path))
-                if m:
-                    if m.group('index') == '0':
-                        index = 'A'  # NOTE: This is broken if there was "A1".
-                    else:
-                        index = m.group('index').upper()
-                    if kind == 'edu':
-                        return cls(contest_id=int(m.group('contest')), index=index, kind=kind, course=int(m.group('course')), lesson=int(m.group('lesson')), step=int(m.group('step')))
-                    else:
-                        return cls(contest_id=int(m.group('contest')), index=index, kind=kind)
+            path = utils.normpath(result.path)
+            m = _PROBLEM_PATH_RE.match(path)
+            if m:
+                kind, prefix = next((kind, prefix) for kind, prefix in _PROBLEM_PATH_KINDS if m.group(prefix + '_idx') is not None)
+                if m.group(prefix + '_idx') == '0':
+                    index = 'A'  # NOTE: This is broken if there was "A1".
+                else:
+                    index = m.group(prefix + '_idx').upper()
+                if kind == 'edu':
+                    return cls(contest_id=int(m.group('e_cid')), index=index, kind=kind, course=int(m.group('e_course')), lesson=int(m.group('e_lesson')), step=int(m.group('e_step')))
+                else:
+                    return cls(contest_id=int(m.group(prefix + '_cid')), index=index, kind=kind)
         return None
 
     def download_data(self, *, session: Optional[requests.Session] = None) -> CodeforcesProblemData:
         for data in self.get_contest().list_problem_data(session=session):
-            if data.problem.get_url() == self.get_url():
+            if (data.problem.contest_id, data.problem.index) == (self.contest_id, self.index):
                 return data
         assert False
 
@@ -3,9 +3,10 @@
 the module for HackerRank (https://www.hackerrank.com/)
 """
 
-import json
+import html
 import re
 import urllib.parse
+import weakref
 from logging import getLogger
 from typing import *
 
@@ -20,16 +21,49 @@ from onlinejudge.type import *
 
 logger = getLogger(__name__)
 
+_CONTEST_CHALLENGE_PATH_RE = re.compile(r'^/contests/([0-9A-Za-z-]+)/challenges/([0-9A-Za-z-]+)(/problem)?/?$')
+_MASTER_CHALLENGE_PATH_RE = re.compile(r'^/challenges/([0-9A-Za-z-]+)(/problem)?/?$')
+_LANG_DISPLAY_MAPPING_RE = re.compile(rb'lang_display_mapping:(\{c:"C",[^}]*\})')
+_LANG_DISPLAY_MAPPING_ITEM_RE = re.compile(r'([$0-9A-Z_a-z]+):"([^"]*)"')
+_CSRF_TOKEN_RES = (
+    re.compile(rb'''<meta[^>]+name=["']csrf-token["'][^>]+content=["']([^"']+)["']'''),
+    re.compile(rb'''<meta[^>]+content=["']([^"']+)["'][^>]+name=["']csrf-token["']'''),
+)
+
+
+def _parse_csrf_token(content: bytes) -> Optional[str]:
+    # NOTE: the token is a single <meta> in <head>, so look for it with regexes first and parse the whole page only when they miss
+    for pattern in _CSRF_TOKEN_RES:
+        m = pattern.search(content)
+        if m:
+            return html.unescape(m.group(1).decode())
+    soup = bs4.BeautifulSoup(content, utils.HTML_PARSER)
+    meta = soup.find('meta', attrs={'name': 'csrf-token'})
+    if meta is None:
+        return None
+    return meta.attrs.get('content')
+
 
 class HackerRankService(onlinejudge.type.Service):
     def get_url_of_login_page(self) -> str:
         return 'https://www.hackerrank.com/auth/login'
 
+    _logged_in_sessions = weakref.WeakSet()  # type: weakref.WeakSet[requests.Session]
+
     def is_logged_in(self, *, session: Optional[requests.Session] = None) -> bool:
+        """
+        :note: only the positive result is cached per session, because a session which is not logged in may log in later. :py:meth:`HackerRankProblem.submit_code` drops the cache when the session looks expired.
+        """
+
         session = session or utils.get_default_session()
+        if session in self._logged_in_sessions:
+            return True
         url = 'https://www.hackerrank.com/auth/login'
         resp = utils.request('GET', url, session=session)
-        return '/auth' not in resp.url
+        if '/auth' in resp.url:
+            return False
+        self._logged_in_sessions.add(session)
+        return True
 
     def get_url(self) -> str:
         return 'https://www.hackerrank.com/'
@@ -40,7 +74,10 @@ class HackerRankService(onlinejudge.type.Service):
     @classmethod
     def from_url(cls, url: str) -> Optional['HackerRankService']:
         # example: https://www.hackerrank.com/dashboard
-        result = urllib.parse.urlparse(url)
+        # NOTE: reject URLs of other services before parsing them, since dispatch tries every service
+        if 'hackerrank.com' not in url:
+            return None
+        result = urllib.parse.urlsplit(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc in ('hackerrank.com', 'www.hackerrank.com'):
             return cls()
@@ -52,6 +89,8 @@ class HackerRankProblem(onlinejudge.type.Problem):
     :ivar contest_slug: :py:class:`str`; this is not `contest_id` because HackerRank itself says this as `contest_slug` in a JSON for submissions.
     :ivar challenge_slug: :py:class:`str`
     """
+    __slots__ = ('contest_slug', 'challenge_slug')
+
     def __init__(self, contest_slug: str, challenge_slug: str):
         self.contest_slug = contest_slug
         self.challenge_slug = challenge_slug
@@ -62,7 +101,7 @@ class HackerRankProblem(onlinejudge.type.Problem):
     def download_system_cases(self, *, session: Optional[requests.Session] = None) -> List[TestCase]:
         session = session or utils.get_default_session()
         # example: https://www.hackerrank.com/rest/contests/hourrank-1/challenges/beautiful-array/download_testcases
-        url = 'https://www.hackerrank.com/rest/contests/{}/challenges/{}/download_testcases'.format(self.contest_slug, self.challenge_slug)
+        url = f'https://www.hackerrank.com/rest/contests/{self.contest_slug}/challenges/{self.challenge_slug}/download_testcases'
         resp = utils.request('GET', url, session=session, raise_for_status=False)
         if resp.status_code == 403:
             logger.debug('HTML: %s', resp.content.decode())
@@ -72,9 +111,9 @@ class HackerRankProblem(onlinejudge.type.Problem):
 
     def get_url(self) -> str:
         if self.contest_slug == 'master':
-            return 'https://www.hackerrank.com/challenges/{}'.format(self.challenge_slug)
+            return f'https://www.hackerrank.com/challenges/{self.challenge_slug}'
         else:
-            return 'https://www.hackerrank.com/contests/{}/challenges/{}'.format(self.contest_slug, self.challenge_slug)
+            return f'https://www.hackerrank.com/contests/{self.contest_slug}/challenges/{self.challenge_slug}'
 
     def get_service(self) -> HackerRankService:
         return HackerRankService()
@@ -83,13 +122,16 @@ class HackerRankProblem(onlinejudge.type.Problem):
     def from_url(cls, url: str) -> Optional['HackerRankProblem']:
         # example: https://www.hackerrank.com/contests/university-codesprint-2/challenges/the-story-of-a-tree
         # example: https://www.hackerrank.com/challenges/fp-hello-world
-        result = urllib.parse.urlparse(url)
+        if 'hackerrank.com' not in url:
+            return None
+        result = urllib.parse.urlsplit(url)
         if result.scheme in ('', 'http', 'https') \
                 and result.netloc in ('hackerrank.com', 'www.hackerrank.com'):
-            m = re.match(r'^/contests/([0-9A-Za-z-]+)/challenges/([0-9A-Za-z-]+)(/problem)?/?$', utils.normpath(result.path))
+            path = utils.normpath(result.path)
+            m = _CONTEST_CHALLENGE_PATH_RE.match(path)
             if m:
                 return cls(contest_slug=m.group(1), challenge_slug=m.group(2))
-            m = re.match(r'^/challenges/([0-9A-Za-z-]+)(/problem)?/?$', utils.normpath(result.path))
+            m = _MASTER_CHALLENGE_PATH_RE.match(path)
             if m:
                 return cls(contest_slug='master', challenge_slug=m.group(1))
         return None
@@ -101,39 +143,42 @@ class HackerRankProblem(onlinejudge.type.Problem):
 
         session = session or utils.get_default_session()
         # get
-        url = 'https://www.hackerrank.com/rest/contests/{}/challenges/{}'.format(self.contest_slug, self.challenge_slug)
+        url = f'https://www.hackerrank.com/rest/contests/{self.contest_slug}/challenges/{self.challenge_slug}'
         resp = utils.request('GET', url, session=session)
         # parse
-        it = json.loads(resp.content.decode())
+        it = utils.json_loads(resp.content)
         logger.debug('json: %s', it)
         if not it['status']:
             logger.error('get model: failed')
             raise SubmissionError
         return it['model']
 
-    def _get_lang_display_mapping(self, *, session: Optional[requests.Session] = None) -> Dict[str, str]:
+    _lang_display_mapping = None  # type: Optional[Dict[str, str]]
+
+    @classmethod
+    def _get_lang_display_mapping(cls, *, session: Optional[requests.Session] = None) -> Dict[str, str]:
+        """`_get_lang_display_mapping` reads the mapping from a JavaScript file and caches the result, since the file is fixed.
+        """
+
         session = session or utils.get_default_session()
-        # get
-        url = 'https://hrcdn.net/hackerrank/assets/codeshell/dist/codeshell-cdffcdf1564c6416e1a2eb207a4521ce.js'  # at "Mon Feb  4 14:51:27 JST 2019"
-        resp = utils.request('GET', url, session=session)
-        # parse
-        s = resp.content.decode()
-        l = s.index('lang_display_mapping:{c:"C",')
-        l = s.index('{', l)
-        r = s.index('}', l) + 1
-        s = s[l:r]
-        logger.debug('lang_display_mapping (raw): %s', s)  # this is not a json
-        lang_display_mapping = {}
-        for lang in s[1:-2].split('",'):
-            key, value = lang.split(':"')
-            lang_display_mapping[key] = value
-        logger.debug('lang_display_mapping (parsed): %s', lang_display_mapping)
-        return lang_display_mapping
+        if cls._lang_display_mapping is None:
+            # get
+            url = 'https://hrcdn.net/hackerrank/assets/codeshell/dist/codeshell-cdffcdf1564c6416e1a2eb207a4521ce.js'  # at "Mon Feb  4 14:51:27 JST 2019"
+            resp = utils.request('GET', url, session=session)
+            # parse
+            m = _LANG_DISPLAY_MAPPING_RE.search(resp.content)
+            if m is None:
+                raise ValueError(f'lang_display_mapping is not found in {url}')
+            s = m.group(1).decode()
+            logger.debug('lang_display_mapping (raw): %s', s)  # this is not a json
+            cls._lang_display_mapping = dict(_LANG_DISPLAY_MAPPING_ITEM_RE.findall(s))
+            logger.debug('lang_display_mapping (parsed): %s', cls._lang_display_mapping)
+        return cls._lang_display_mapping
 
     def get_available_languages(self, *, session: Optional[requests.Session] = None) -> List[Language]:
         session = session or utils.get_default_session()
         info = self._get_model(session=session)
-        lang_display_mapping = self._get_lang_display_mapping()
+        lang_display_mapping = self._get_lang_display_mapping(session=session)
         result = []  # type: List[Language]
         for lang in info['languages']:
             descr = lang_display_mapping.get(lang)
@@ -152,24 +197,40 @@ class HackerRankProblem(onlinejudge.type.Problem):
         session = session or utils.get_default_session()
         if not self.get_service().is_logged_in(session=session):
             raise NotLoggedInError
+        # NOTE: the session may have expired after is_logged_in() cached it, so forget it when a failure looks so
         # get
-        resp = utils.request('GET', self.get_url(), session=session)
+        try:
+            resp = utils.request('GET', self.get_url(), session=session)
+        except requests.HTTPError as e:
+            HackerRankService._logged_in_sessions.discard(session)
+            if e.response is not None and e.response.status_code in (401, 403):
+                raise NotLoggedInError from e
+            raise
         # parse
-        soup = bs4.BeautifulSoup(resp.text, utils.HTML_PARSER)
-        csrftoken = soup.find('meta', attrs={'name': 'csrf-token'}).attrs['content']
+        csrftoken = _parse_csrf_token(resp.content)
+        if csrftoken is None:
+            HackerRankService._logged_in_sessions.discard(session)
+            logger.error('CSRF token not found')
+            raise NotLoggedInError
         # post
-        url = 'https://www.hackerrank.com/rest/contests/{}/challenges/{}/submissions'.format(self.contest_slug, self.challenge_slug)
+        url = f'https://www.hackerrank.com/rest/contests/{self.contest_slug}/challenges/{self.challenge_slug}/submissions'
         payload = {'code': code.decode('utf-8'), 'language': str(language_id), 'contest_slug': self.contest_slug}
         logger.debug('payload: %s', payload)
-        resp = utils.request('POST', url, session=session, json=payload, headers={'X-CSRF-Token': csrftoken})
+        try:
+            resp = utils.request('POST', url, session=session, json=payload, headers={'X-CSRF-Token': csrftoken})
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in (401, 403):
+                HackerRankService._logged_in_sessions.discard(session)
+                raise NotLoggedInError from e
+            raise
         # parse
-        it = json.loads(resp.content.decode())
+        it = utils.json_loads(resp.content)
         logger.debug('json: %s', it)
         if not it['status']:
             logger.error('Submit Code: failed')
             raise SubmissionError
         model_id = it['model']['id']
-        url = self.get_url().rstrip('/') + '/submissions/code/{}'.format(model_id)
+        url = self.get_url().rstrip('/') + f'/submissions/code/{model_id}'
         logger.info('success: result: %s', url)
         return utils.DummySubmission(url, problem=self)
 
@@ -123,6 +123,8 @@ class DownloadedData(ABC):
 
     .. versionadded:: 7.0.0
     """
+    __slots__ = ()  # type: Tuple[str, ...]
+
     @property
     @abstractmethod
     def url(self) -> str:
@@ -153,6 +155,8 @@ class ContestData(DownloadedData):
     """
     .. versionadded:: 7.0.0
     """
+    __slots__ = ()  # type: Tuple[str, ...]
+
     @property
     def url(self) -> str:
         return self.contest.get_url()
@@ -178,6 +182,8 @@ class Contest(ABC):
 
     .. versionadded:: 7.0.0
     """
+    __slots__ = ()  # type: Tuple[str, ...]
+
     def list_problems(self, *, session: Optional[requests.Session] = None) -> Sequence['Problem']:
         raise NotImplementedError
 
@@ -208,6 +214,8 @@ class ProblemData(DownloadedData):
     """
     .. versionadded:: 7.0.0
     """
+    __slots__ = ()  # type: Tuple[str, ...]
+
     @property
     def url(self) -> str:
         return self.problem.get_url()
@@ -245,8 +253,12 @@ class ProblemData(DownloadedData):
 class Problem(ABC):
     """
     :note: :py:class:`Problem` represents just a URL of a problem, without the data of the problem.
+           The exception is that data which never changes once published (e.g. sample cases, or the problem behind an arena URL) may be cached in the process. The implementations which cache sample cases accept `refresh=True` in :py:meth:`download_sample_cases` to bypass the cache.
            :py:class:`Problem` はちょうど問題の URL のみを表現します。キャッシュや内部状態は持ちません。
+           ただし、公開後に変化しないデータ (サンプルケースや、アリーナの URL が指す問題など) はプロセス内でキャッシュされることがあります。サンプルケースをキャッシュする実装の :py:meth:`download_sample_cases` は、キャッシュを無視するための `refresh=True` を受け付けます。
     """
+    __slots__ = ()  # type: Tuple[str, ...]
+
     @abstractmethod
     def download_sample_cases(self, *, session: Optional[requests.Session] = None) -> List[TestCase]:
         """
@@ -10,6 +10,7 @@ from logging import getLogger
 from typing import *
 
 import appdirs
+import urllib3.util.retry
 
 from onlinejudge.type import *
 
@@ -33,6 +34,12 @@ def get_default_session() -> requests.Session:
     global _DEFAULT_SESSION
     if _DEFAULT_SESSION is None:
         _DEFAULT_SESSION = requests.session()
+        # NOTE: keep more connections alive than the default, since the session is shared among all problems and services in the process
+        # NOTE: only idempotent requests are retried, so submissions are never sent twice
+        retry = urllib3.util.retry.Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+        _DEFAULT_SESSION.mount('https://', adapter)
+        _DEFAULT_SESSION.mount('http://', adapter)
     return _DEFAULT_SESSION
 
 
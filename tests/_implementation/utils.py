@@ -0,0 +1,22 @@
+import unittest
+import unittest.mock
+
+import requests
+
+import onlinejudge._implementation.utils as utils
+
+
+class RequestTest(unittest.TestCase):
+    def test_headers(self):
+        session = requests.Session()
+        with unittest.mock.patch.object(session, 'request', return_value=unittest.mock.Mock(status_code=200, url='https://example.com/')) as request:
+            utils.request('GET', 'https://example.com/', session=session, headers={'X-CSRF-Token': 'token'})
+        _, kwargs = request.call_args
+        self.assertEqual(kwargs['headers'], {'User-Agent': 'Mozilla/5.0', 'X-CSRF-Token': 'token'})
+
+    def test_headers_override(self):
+        session = requests.Session()
+        with unittest.mock.patch.object(session, 'request', return_value=unittest.mock.Mock(status_code=200, url='https://example.com/')) as request:
+            utils.request('GET', 'https://example.com/', session=session, headers={'User-Agent': 'foo'})
+        _, kwargs = request.call_args
+        self.assertEqual(kwargs['headers'], {'User-Agent': 'foo'})
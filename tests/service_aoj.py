@@ -1,5 +1,11 @@
+import json
+import pathlib
+import shutil
+import tempfile
 import unittest
+import unittest.mock
 
+import onlinejudge._implementation.utils as utils
 from onlinejudge.service.aoj import AOJArenaProblem, AOJProblem, AOJService
 from onlinejudge.type import TestCase
 
@@ -49,6 +55,68 @@ class AOJProblemTest(unittest.TestCase):
         ])
 
 
+class AOJProblemSampleCasesCacheTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        patcher = unittest.mock.patch.object(utils, 'user_cache_dir', pathlib.Path(tempdir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch.dict(AOJProblem._sample_cases, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_cache(self, problem_id: str, content: str) -> None:
+        path = utils.user_cache_dir / 'aoj' / f'{problem_id}.json'
+        path.parent.mkdir(parents=True)
+        path.write_text(content)
+
+    def test_not_modified(self):
+        self._write_cache('DSL_1_A', json.dumps({
+            'etag': '"abc"',
+            'last_modified': None,
+            'samples': [{
+                'name': 'sample-1',
+                'input_name': '1',
+                'input_data': '1 2\n',
+                'output_name': '1',
+                'output_data': '3\n'
+            }],
+        }))
+        resp = unittest.mock.Mock(status_code=304, headers={}, content=b'')
+        with unittest.mock.patch.object(utils, 'request', return_value=resp) as request:
+            samples = AOJProblem(problem_id='DSL_1_A').download_sample_cases()
+        _, kwargs = request.call_args
+        self.assertEqual(kwargs['headers'], {'If-None-Match': '"abc"'})
+        self.assertEqual(samples, [
+            TestCase(name='sample-1', input_name='1', input_data=b'1 2\n', output_name='1', output_data=b'3\n'),
+        ])
+
+    def test_broken_cache(self):
+        for content in ('[]', '{"etag": "\\"abc\\""}', '{"samples": [{}]}', '{'):
+            with self.subTest(content=content):
+                shutil.rmtree(str(utils.user_cache_dir / 'aoj'), ignore_errors=True)
+                self._write_cache('DSL_1_A', content)
+                AOJProblem._sample_cases.clear()
+                resp = unittest.mock.Mock(status_code=200, headers={}, content=b'[{"serial": 1, "in": "1 2\\n", "out": "3\\n"}]')
+                with unittest.mock.patch.object(utils, 'request', return_value=resp) as request:
+                    samples = AOJProblem(problem_id='DSL_1_A').download_sample_cases()
+                _, kwargs = request.call_args
+                self.assertEqual(kwargs['headers'], {})
+                self.assertEqual(samples, [
+                    TestCase(name='sample-1', input_name='1', input_data=b'1 2\n', output_name='1', output_data=b'3\n'),
+                ])
+
+    def test_unwritable_cache(self):
+        (utils.user_cache_dir / 'aoj').write_text('')  # a file blocks making the directory
+        resp = unittest.mock.Mock(status_code=200, headers={'ETag': '"abc"'}, content=b'[{"serial": 1, "in": "1 2\\n", "out": "3\\n"}]')
+        with unittest.mock.patch.object(utils, 'request', return_value=resp):
+            samples = AOJProblem(problem_id='DSL_1_A').download_sample_cases()
+        self.assertEqual(samples, [
+            TestCase(name='sample-1', input_name='1', input_data=b'1 2\n', output_name='1', output_data=b'3\n'),
+        ])
+
+
 class AOJArenaProblemTest(unittest.TestCase):
     def test_from_url(self):
         self.assertEqual(AOJArenaProblem.from_url('https://onlinejudge.u-aizu.ac.jp/services/room.html#RitsCamp19Day2/problems/A').arena_id, 'RitsCamp19Day2')
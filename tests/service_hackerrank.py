@@ -0,0 +1,27 @@
+import unittest
+import unittest.mock
+
+import bs4
+
+from onlinejudge.service.hackerrank import _parse_csrf_token
+
+
+class ParseCsrfTokenTest(unittest.TestCase):
+    def test_name_first(self):
+        content = b'<html><head><meta charset="utf-8"><meta name="csrf-token" content="abc+/DEF=="></head><body></body></html>'
+        with unittest.mock.patch.object(bs4, 'BeautifulSoup', side_effect=AssertionError('the regexes should find the token')):
+            self.assertEqual(_parse_csrf_token(content), 'abc+/DEF==')
+
+    def test_content_first(self):
+        content = b'<html><head><meta content=\'abc+/DEF==\' name=\'csrf-token\' /></head><body></body></html>'
+        with unittest.mock.patch.object(bs4, 'BeautifulSoup', side_effect=AssertionError('the regexes should find the token')):
+            self.assertEqual(_parse_csrf_token(content), 'abc+/DEF==')
+
+    def test_escaped(self):
+        content = b'<html><head><meta name="csrf-token" content="abc&amp;def&#61;"></head><body></body></html>'
+        self.assertEqual(_parse_csrf_token(content), 'abc&def=')
+
+    def test_fallback(self):
+        # NOTE: the regexes expect quoted attributes, so this is parsed by bs4
+        content = b'<html><head><meta name=csrf-token content=abcDEF></head><body></body></html>'
+        self.assertEqual(_parse_csrf_token(content), 'abcDEF')